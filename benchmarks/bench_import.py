@@ -0,0 +1,48 @@
+"""
+Benchmark the time taken to import mwhutils.random in a fresh interpreter.
+"""
+
+# future imports
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+# global imports
+import subprocess
+import sys
+
+# time the import in a child process which has already loaded numpy, since
+# that is shared with everything else; also report which of the sequence
+# backends were loaded as a side effect.
+SCRIPT = """
+import sys, time
+import numpy
+t = time.time()
+import {0}
+t = time.time() - t
+loaded = [m for m in ('_sobol', '_halton', '_lattice')
+          if 'mwhutils.random.' + m in sys.modules]
+sys.stdout.write('%r %s' % (t, ','.join(loaded) or '-'))
+"""
+
+
+def import_time(module, repeat=20):
+    """
+    Return the best time taken to import `module` over `repeat` fresh
+    interpreters, along with the backends which were loaded.
+    """
+    times = []
+    for _ in xrange(repeat):
+        out = subprocess.check_output([sys.executable, '-c',
+                                       SCRIPT.format(module)])
+        t, loaded = out.split()
+        times.append(float(t))
+    return min(times), loaded
+
+
+if __name__ == '__main__':
+    print('{:>24} {:>10} {:>24}'.format('module', 'time (ms)', 'backends'))
+
+    for module in ['mwhutils.random', 'mwhutils.random._sobol']:
+        t, loaded = import_time(module)
+        print('{:>24} {:10.2f} {:>24}'.format(module, 1e3 * t, loaded))
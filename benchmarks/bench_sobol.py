@@ -0,0 +1,45 @@
+"""
+Benchmark the vectorized Sobol generator against the per-point loop.
+"""
+
+# future imports
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+# global imports
+import timeit
+import numpy as np
+
+# local imports
+from mwhutils.random._sobol import i4_sobol, i4_sobol_generate
+
+
+def sobol_loop(m, n, skip):
+    """
+    Generate Sobol points by calling `i4_sobol` once per point.
+    """
+    r = np.zeros((m, n))
+    for j in xrange(n):
+        r[:, j], _ = i4_sobol(m, skip + j - 1)
+    return r
+
+
+def rate(method, m, n, number=3):
+    """
+    Return the number of points per second generated by `method`.
+    """
+    time = min(timeit.repeat(lambda: method(m, n, 100), number=1,
+                             repeat=number))
+    return n / time
+
+
+if __name__ == '__main__':
+    print('{:>6} {:>8} {:>14} {:>14} {:>8}'.format(
+        'dim', 'n', 'loop (pts/s)', 'vector (pts/s)', 'speedup'))
+
+    for m, n in [(2, 10000), (10, 10000), (100, 10000), (10, 1000000)]:
+        r2 = rate(i4_sobol_generate, m, n)
+        r1 = rate(sobol_loop, m, min(n, 10000), number=1)
+        print('{:6d} {:8d} {:14.0f} {:14.0f} {:8.1f}'.format(
+            m, n, r1, r2, r2 / r1))
@@ -9,10 +9,50 @@ from __future__ import print_function
 import numpy as np
 import scipy.linalg as sla
 
-__all__ = ['chol_update']
+__all__ = ['chol_robust', 'chol_update', 'chol_update_batch', 'chol_remove',
+           'chol_rank_update', 'IncrementalCholesky']
 
+# the initial jitter used by chol_robust relative to the mean of the diagonal,
+# and the factor by which it is increased after each failure.
+JITTER = 1e-10
+JITTER_FACTOR = 10
 
-def chol_update(A, B, C, a, b):
+
+def chol_robust(A, jitter=None, maxtries=8):
+    """
+    Compute the cholesky decomposition of a possibly ill-conditioned matrix.
+
+    Return the upper-triangular cholesky decomposition of `A` and the jitter
+    that was added to its diagonal, which is zero if the decomposition of `A`
+    itself succeeds. Otherwise it is retried for up to `maxtries` times with
+    jitter starting at `jitter`, by default JITTER times the mean of the
+    diagonal, and growing geometrically. If these all fail LinAlgError is
+    raised.
+    """
+    try:
+        return sla.cholesky(A), 0.0
+    except np.linalg.LinAlgError:
+        pass
+
+    if jitter is None:
+        jitter = JITTER * (np.mean(np.abs(np.diag(A))) or 1)
+
+    A = np.array(A, dtype=float)
+    diag = np.diag(A).copy()
+    idx = np.diag_indices_from(A)
+
+    for _ in xrange(maxtries):
+        A[idx] = diag + jitter
+        try:
+            return sla.cholesky(A), jitter
+        except np.linalg.LinAlgError:
+            jitter *= JITTER_FACTOR
+
+    raise np.linalg.LinAlgError('matrix is not positive definite even with '
+                                'jitter %g' % (jitter / JITTER_FACTOR))
+
+
+def chol_update(A, B, C, a, b, robust=False):
     """
     Update the cholesky decomposition of a growing matrix.
 
@@ -21,16 +61,371 @@ def chol_update(A, B, C, a, b):
     matrix which has additional elements `B` and the non-diagonal and `C` on
     the diagonal block. It also computes the solution to the application of the
     inverse where the vector has additional elements `b`.
+
+    If `robust` is true the new block is decomposed using `chol_robust`, in
+    which case the jitter that had to be added to the diagonal of `C` is
+    also returned. Only this decomposition is retried, not the triangular
+    solve which precedes it.
     """
     n = A.shape[0]
     m = C.shape[0]
 
     B = sla.solve_triangular(A, B, trans=True)
-    C = sla.cholesky(C - np.dot(B.T, B))
+    S = C - np.dot(B.T, B)
+
+    if robust:
+        # the schur complement S can be close to zero, so the jitter is
+        # scaled relative to the block C of the original matrix instead.
+        jitter = JITTER * (np.mean(np.abs(np.diag(C))) or 1)
+        C, jitter = chol_robust(S, jitter)
+    else:
+        C = sla.cholesky(S)
+
     c = np.dot(B.T, a)
 
     # grow the new cholesky and use then use this to grow the vector a.
     A = np.r_[np.c_[A, B], np.c_[np.zeros((m, n)), C]]
     a = np.r_[a, sla.solve_triangular(C, b-c, trans=True)]
 
+    if robust:
+        return A, a, jitter
+    return A, a
+
+
+def chol_update_batch(A, B, C, a, b):
+    """
+    Update the cholesky decompositions of a batch of growing matrices.
+
+    This is equivalent to calling `chol_update` on each element of the
+    stacked arrays `A` of shape (batch, n, n), `B` of shape (batch, n, m),
+    `C` of shape (batch, m, m), and `a` and `b` of shapes (batch, n) and
+    (batch, m) or (batch, n, k) and (batch, m, k), but updates the whole
+    batch at once. The triangular solves use forward substitution over the
+    rows, vectorized over the batch, which is much faster than calling
+    LAPACK for each element when the matrices are small.
+    """
+    A, B, C = np.asarray(A), np.asarray(B), np.asarray(C)
+    a, b = np.asarray(a), np.asarray(b)
+    batch, n, m = B.shape
+
+    # treat vectors as matrices with a single column.
+    vector = a.ndim == 2
+    if vector:
+        a, b = a[..., None], b[..., None]
+
+    B = _solve_batch(A, B)
+    Bt = np.swapaxes(B, 1, 2)
+    C = np.swapaxes(np.linalg.cholesky(C - np.matmul(Bt, B)), 1, 2)
+    c = np.matmul(Bt, a)
+
+    # grow the new choleskys and then use these to grow the vectors a.
+    R = np.zeros((batch, n+m, n+m))
+    R[:, :n, :n] = A
+    R[:, :n, n:] = B
+    R[:, n:, n:] = C
+    a = np.concatenate([a, _solve_batch(C, b-c)], axis=1)
+
+    return R, a[..., 0] if vector else a
+
+
+def chol_remove(A, a, idx):
+    """
+    Update the cholesky decomposition of a shrinking matrix.
+
+    Let `A` denote an upper-triangular cholesky decomposition of some matrix
+    and `a` the inverse of its transpose applied to some vector `y`, or None.
+    This computes the cholesky of the matrix with the rows and columns `idx`
+    removed, and the corresponding vector `a` for `y` with those elements
+    removed.
+
+    The rows and columns before the first removed index are unchanged. The
+    remaining ones are given by a rank-k update of the kept part of the
+    factor by its removed rows, where k is the number of removed indices, so
+    this takes O(k n^2) time rather than the O(n^3) of refactoring.
+    """
+    idx, keep = _split_indices(A.shape[0], idx)
+
+    # the removed rows of the factor, restricted to the kept columns which
+    # follow the first removed index, and the corresponding elements of a.
+    j = np.searchsorted(keep, idx[0]) if len(idx) else len(keep)
+    X = A[np.ix_(idx, keep[j:])]
+    z = None if a is None else a[idx]
+
+    A = A[np.ix_(keep, keep)]
+    a = None if a is None else a[keep]
+    _rank_update(A[j:, j:], X, None if a is None else a[j:], z)
+
     return A, a
+
+
+def chol_rank_update(A, U, downdate=False, overwrite=False):
+    """
+    Update the cholesky decomposition of a matrix by a low-rank term.
+
+    Let `A` denote an upper-triangular cholesky decomposition of some matrix
+    K. This computes the cholesky of K + U U^T, or of K - U U^T if
+    `downdate` is true, where `U` is a vector or an (n, k) matrix, in
+    O(k n^2) time. If `overwrite` is true the factor is updated in place.
+
+    A downdate raises LinAlgError if the resulting matrix is not (numerically)
+    positive definite; in this case an overwritten factor is left partially
+    updated.
+    """
+    A = A if overwrite else np.array(A, dtype=float)
+    X = np.array(np.transpose(U), dtype=float, ndmin=2)
+
+    if downdate:
+        _rank_downdate(A, X)
+    else:
+        _rank_update(A, X)
+
+    return A
+
+
+class IncrementalCholesky(object):
+    """
+    Cholesky decomposition of a growing matrix, which is updated in place.
+
+    This computes the same upper-triangular factor `R` and vector `a` as
+    repeated calls to `chol_update`, but stores them in over-allocated
+    buffers whose capacity is doubled whenever they fill up. Appending to the
+    matrix then writes only the new rows and columns rather than copying the
+    whole factor. The factor and vector are exposed as views of the active
+    part of these buffers, so they should be looked up again after each
+    update.
+
+    If given, `R` is the factor of an initial matrix and `a` the inverse of
+    its transpose applied to some vector `y`; this vector is only tracked if
+    `a` is given, or if `b` is given by the first update of an empty matrix.
+    """
+    def __init__(self, R=None, a=None, capacity=16):
+        n = 0 if R is None else R.shape[0]
+        capacity = max(n, capacity, 1)
+
+        self.n = n
+        self._R = np.zeros((capacity, capacity))
+        self._a = None
+
+        if n > 0:
+            self._R[:n, :n] = np.triu(R)
+        if a is not None:
+            a = np.asarray(a, dtype=float)
+            self._a = np.zeros((capacity,) + a.shape[1:])
+            self._a[:n] = a
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacity(self):
+        """The number of rows which can be held without reallocating."""
+        return self._R.shape[0]
+
+    @property
+    def R(self):
+        """The upper-triangular cholesky factor, as a view."""
+        return self._R[:self.n, :self.n]
+
+    @property
+    def a(self):
+        """The vector A^{-T} y, as a view, or None if it isn't tracked."""
+        return None if self._a is None else self._a[:self.n]
+
+    def update(self, B, C, b=None):
+        """
+        Grow the matrix by appending the columns `B` and the diagonal block
+        `C`, and grow `y` by appending the elements `b`; see `chol_update`.
+        """
+        n, m = self.n, C.shape[0]
+
+        if b is not None and self._a is None and n == 0:
+            b = np.asarray(b, dtype=float)
+            self._a = np.zeros((self.capacity,) + b.shape[1:])
+        if (b is None) != (self._a is None):
+            raise ValueError('b must be given if and only if a is tracked')
+
+        self._reserve(n + m)
+        R = self._R
+
+        # the new columns of the factor and its new diagonal block.
+        if n > 0:
+            B = _solve_leading(R, n, B)
+            R[:n, n:n+m] = B
+            R[n:n+m, n:n+m] = sla.cholesky(C - np.dot(B.T, B))
+        else:
+            R[:m, :m] = sla.cholesky(C)
+
+        if b is not None:
+            c = np.dot(B.T, self._a[:n]) if n > 0 else 0
+            self._a[n:n+m] = sla.solve_triangular(R[n:n+m, n:n+m], b-c,
+                                                  trans=True)
+
+        self.n = n + m
+        return self
+
+    def remove(self, idx):
+        """
+        Shrink the matrix by removing the rows and columns `idx`, and remove
+        the same elements from `y`; see `chol_remove`. This works in place on
+        the buffers, so only the removed rows are copied.
+        """
+        n, R, a = self.n, self._R, self._a
+        idx, keep = _split_indices(n, idx)
+        m = len(keep)
+        if m == n:
+            return self
+
+        # the removed rows of the factor restricted to the kept columns which
+        # follow the first removed index i, and the corresponding elements of
+        # a; the rows and columns before i are all kept.
+        i = idx[0]
+        X = R[np.ix_(idx, keep[i:])]
+        z = None if a is None else a[idx]
+
+        # move the kept rows and columns into place in a single pass over the
+        # rows, each of which is contiguous in the buffer. Row j is read from
+        # row keep[j] >= j, so no row is read after it has been overwritten;
+        # only the columns from i onwards move.
+        for j, k in enumerate(keep):
+            R[j, i:m] = R[k, keep[i:]]
+        if a is not None:
+            a[i:m] = a[keep[i:]]
+
+        # zero the rows and columns which are no longer used, since later
+        # updates only write the upper-triangular part of new blocks.
+        R[m:n, :n] = 0
+        R[:n, m:n] = 0
+
+        _rank_update(R[i:m, i:m], X, None if a is None else a[i:m], z)
+
+        self.n = m
+        return self
+
+    def _reserve(self, size):
+        """
+        Make sure the buffers can hold at least `size` rows, by at least
+        doubling their capacity if necessary.
+        """
+        if size <= self.capacity:
+            return
+        capacity = max(size, 2 * self.capacity)
+        n = self.n
+
+        R = np.zeros((capacity, capacity))
+        R[:n, :n] = self._R[:n, :n]
+        self._R = R
+
+        if self._a is not None:
+            a = np.zeros((capacity,) + self._a.shape[1:])
+            a[:n] = self._a[:n]
+            self._a = a
+
+
+def _split_indices(n, idx):
+    """
+    Return the sorted unique indices `idx` of rows to remove from a matrix
+    with `n` rows, and the indices of the rows which are kept.
+    """
+    idx = np.unique(np.asarray(idx, dtype=int))
+    if len(idx) and not 0 <= idx[0] <= idx[-1] < n:
+        raise IndexError('index out of range')
+    return idx, np.setdiff1d(np.arange(n), idx)
+
+
+def _solve_leading(R, n, B):
+    """
+    Return the solution to `R[:n, :n].T x = B` where `R` is a C-ordered
+    upper-triangular buffer. The first n rows of `R` are contiguous, ie its
+    transpose is a Fortran-ordered lower-triangular matrix whose first n
+    columns LAPACK can read in place using the buffer's leading dimension;
+    slicing the block itself would force scipy to copy it.
+    """
+    x, info = sla.lapack.dtrtrs(R.T[:, :n], B, lower=1)
+    if info > 0:
+        raise np.linalg.LinAlgError('singular cholesky factor')
+    return x
+
+
+def _rank_update(R, X, a=None, z=None):
+    """
+    Overwrite the upper-triangular factor `R` of some matrix with the factor
+    of that matrix plus `X.T X`, where `X` has k rows, in O(k n^2) time.
+
+    This applies one Householder reflection per column to the stacked
+    matrix [R; X] in order to zero out X. If given, the same reflections are
+    applied to the stacked vector [a; z], so that if R.T a + X.T z = y before
+    the update then R.T a = y afterwards. Both `X` and `z` are overwritten.
+    """
+    for i in xrange(R.shape[0]):
+        w = X[:, i].copy()
+        r = R[i, i]
+        norm = np.sqrt(r*r + np.dot(w, w))
+        if norm == 0:
+            continue
+
+        # the reflection maps the column [r; w] to [-norm; 0], after which
+        # the sign of the row is flipped to keep the diagonal positive.
+        u = r + norm
+        beta = 1 / (norm * u)
+
+        # the row is read and written only once, since it may be strided.
+        row = R[i, i:].copy()
+        t = np.dot(w, X[:, i:])
+        t += u * row
+        t *= beta
+        R[i, i:] = u * t - row
+        X[:, i:] -= np.multiply.outer(w, t)
+
+        if a is not None:
+            t = beta * (u * a[i] + np.dot(w, z))
+            a[i] -= u * t
+            a[i] *= -1
+            z -= np.multiply.outer(w, t)
+
+
+def _rank_downdate(R, X):
+    """
+    Overwrite the upper-triangular factor `R` of some matrix with the factor
+    of that matrix minus `X.T X`, where `X` has k rows, in O(k n^2) time.
+
+    For each column a Householder reflection of the rows of X, which leaves
+    X.T X unchanged, first collects the column of X into its first row. A
+    hyperbolic rotation of that row against the row of R, applied in the
+    mixed form which is more stable than applying it directly, then zeros it.
+    `X` is overwritten.
+    """
+    for i in xrange(R.shape[0]):
+        w = X[:, i].copy()
+        norm = np.sqrt(np.dot(w, w))
+        if norm == 0:
+            continue
+
+        # reflect the rows of X so that X[1:, i] is zero.
+        if len(w) > 1:
+            w[0] += norm if w[0] >= 0 else -norm
+            t = np.dot(w, X[:, i:]) * 2 / np.dot(w, w)
+            X[:, i:] -= np.multiply.outer(w, t)
+
+        r, x = R[i, i], X[0, i]
+        if not abs(x) < r:
+            raise np.linalg.LinAlgError('downdated matrix is not positive '
+                                        'definite')
+
+        t = x / r
+        c = np.sqrt((1 - t) * (1 + t))
+        R[i, i:] -= t * X[0, i:]
+        R[i, i:] /= c
+        X[0, i:] *= c
+        X[0, i:] -= t * R[i, i:]
+
+
+def _solve_batch(R, B):
+    """
+    Return the solutions to `R[i].T X[i] = B[i]` for the stacked (batch, n, n)
+    upper-triangular matrices `R` and (batch, n, m) right-hand sides `B`.
+    """
+    X = np.array(B, dtype=float)
+    for i in xrange(R.shape[1]):
+        X[:, i] /= R[:, i, i, None]
+        X[:, i+1:] -= R[:, i, i+1:, None] * X[:, i, None, :]
+    return X
@@ -0,0 +1,84 @@
+"""
+Vectorized generation of (scrambled) Halton sequences.
+"""
+
+# future imports
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+# global imports
+import numpy as np
+
+# the number of digits for which scrambling coefficients are drawn; this is
+# enough for each coordinate to reach the precision of a double in any base.
+DIGITS = 64
+
+
+def primes(n):
+    """
+    Return the first `n` primes, computed using a sieve of Eratosthenes.
+    """
+    # by Rosser's theorem this is an upper bound on the nth prime for n >= 6.
+    m = 13 if n < 6 else int(n * (np.log(n) + np.log(np.log(n)))) + 1
+
+    sieve = np.ones(m+1, dtype=bool)
+    sieve[:2] = False
+    for p in xrange(2, int(np.sqrt(m)) + 1):
+        if sieve[p]:
+            sieve[p*p::p] = False
+
+    return np.flatnonzero(sieve)[:n]
+
+
+def scramble_digits(bases, rng):
+    """
+    Return random (DIGITS, d) arrays `mult` and `shift` defining, for each
+    dimension and digit position, the permutation a -> (mult*a + shift) mod b
+    of the digits in base b. This is a random linear digit scrambling, where
+    the multiplier is drawn uniformly from 1, ..., b-1 independently for each
+    digit, rather than the fixed per-dimension multipliers of the generalized
+    Halton sequence of Faure and Lemieux. The random shift means that the
+    digits in base 2 are also randomized.
+    """
+    d = len(bases)
+    mult = 1 + (rng.rand(DIGITS, d) * (bases - 1)).astype(int)
+    shift = (rng.rand(DIGITS, d) * bases).astype(int)
+    return mult, shift
+
+
+def generate(bases, start, n, mult=None, shift=None):
+    """
+    Return the `n` points with indices `start`, ..., `start+n-1` of the Halton
+    sequence with the given increasing `bases` as an (n, d) array. If given,
+    each digit is permuted using the arrays `mult` and `shift` returned by
+    `scramble_digits`.
+    """
+    d = len(bases)
+    if mult is None:
+        mult = np.ones((DIGITS, d), dtype=int)
+        shift = np.zeros((DIGITS, d), dtype=int)
+
+    # the number of digits of the largest index in each base, and the scale
+    # of each digit position.
+    pos = np.arange(DIGITS)[:, None]
+    ndigits = np.sum(np.float64(bases) ** pos <= start + n - 1, axis=0)
+    scales = np.cumprod(np.tile(1.0 / bases, (DIGITS, 1)), axis=0)
+
+    # the digits past ndigits are zero for every index, so they contribute the
+    # same (permuted) value to every point.
+    X = np.empty((n, d))
+    X[...] = np.sum((pos >= ndigits) * shift * scales, axis=0)
+
+    # add the remaining digits, vectorized over points and dimensions. Since
+    # the bases are increasing the dimensions which still have non-zero digits
+    # form a prefix of the columns.
+    K = np.empty((n, d), dtype=np.int64)
+    K[...] = np.arange(start, start+n)[:, None]
+    for j in xrange(ndigits.max()):
+        m = np.sum(ndigits > j)
+        b = bases[:m]
+        K[:, :m], a = np.divmod(K[:, :m], b)
+        X[:, :m] += ((mult[j, :m] * a + shift[j, :m]) % b) * scales[j, :m]
+
+    return X
@@ -0,0 +1,255 @@
+"""
+Optimization of Latin hypercube designs by exchanging levels within columns.
+"""
+
+# future imports
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+# global imports
+import numpy as np
+
+# the (even) exponent of the phi_p criterion of Morris and Mitchell, which for
+# large values orders designs by their minimum distance.
+PHI_P = 50
+
+# the number of candidate exchanges evaluated at each iteration, and the
+# initial acceptance threshold relative to the criterion of the random design.
+CANDIDATES = 50
+THRESHOLD = 0.005
+
+
+def inverse_power(D):
+    """
+    Return D**(-PHI_P/2) for the squared distances `D`, computed by repeated
+    squaring since this is much faster than the general power function.
+    """
+    R = 1 / D
+    E = np.ones_like(R)
+    k = PHI_P // 2
+    while True:
+        if k & 1:
+            E *= R
+        k >>= 1
+        if not k:
+            return E
+        R *= R
+
+
+class PhiP(object):
+    """
+    The phi_p criterion sum_{i<k} d_ik**-p for the levels `P`, which is a
+    smooth surrogate for maximizing the minimum distance between points. The
+    squared distances between the levels are integers of at least d, so the
+    terms can neither overflow nor divide by zero.
+    """
+    def __init__(self, P):
+        self.P = P
+        self.D = np.zeros((len(P), len(P)))
+        for k in xrange(P.shape[1]):
+            self.D += (P[:, k, None] - P[:, k]).astype(float)**2
+        with np.errstate(divide='ignore'):
+            self.E = inverse_power(self.D)
+        np.fill_diagonal(self.E, 0)
+        self.value = np.sum(self.E) / 2
+
+    def _rows(self, j, a, b):
+        # the new squared distances from rows a and b to every other row
+        # after exchanging their levels in column j.
+        col = self.P[:, j].astype(float)
+        t = (col[b, None] - col)**2 - (col[a, None] - col)**2
+        rows = np.arange(len(col))
+        mask = (rows == a[:, None]) | (rows == b[:, None])
+        return self.D[a] + t, self.D[b] - t, mask
+
+    def _delta(self, Da, Db, a, b, mask):
+        with np.errstate(divide='ignore'):
+            Ea = np.where(mask, 0, inverse_power(Da) - self.E[a])
+            Eb = np.where(mask, 0, inverse_power(Db) - self.E[b])
+        return Ea, Eb
+
+    def deltas(self, j, a, b):
+        """
+        Return the change in the criterion from exchanging the levels of rows
+        `a` and `b` in column `j`, vectorized over the candidates `a`, `b`.
+        """
+        Da, Db, mask = self._rows(j, a, b)
+        Ea, Eb = self._delta(Da, Db, a, b, mask)
+        return np.sum(Ea, axis=1) + np.sum(Eb, axis=1)
+
+    def exchange(self, j, a, b):
+        """
+        Exchange the levels of rows `a` and `b` in column `j`.
+        """
+        a, b = np.array([a]), np.array([b])
+        Da, Db, mask = self._rows(j, a, b)
+        Ea, Eb = self._delta(Da, Db, a, b, mask)
+        delta = np.sum(Ea) + np.sum(Eb)
+
+        mask = ~mask[0]
+        for r, D in [(a[0], Da[0]), (b[0], Db[0])]:
+            self.D[r, mask] = self.D[mask, r] = D[mask]
+            self.E[r, mask] = self.E[mask, r] = inverse_power(D[mask])
+        self.P[[a[0], b[0]], j] = self.P[[b[0], a[0]], j]
+
+        # the criterion can shrink by orders of magnitude, in which case it is
+        # recomputed so that the rounding errors of the updates made while it
+        # was larger don't dominate.
+        if -delta > self.value / 2:
+            self.value = np.sum(self.E) / 2
+        else:
+            self.value += delta
+
+
+class Correlation(object):
+    """
+    The sum of the squared inner products between the centred columns of the
+    levels `P`. Since every column is a permutation of the same levels this is
+    proportional to the sum of their squared pairwise correlations.
+    """
+    def __init__(self, P):
+        self.P = P
+        self.C = P - (len(P) - 1) / 2
+        self.G = np.dot(self.C.T, self.C)
+        self.value = (np.sum(self.G**2) - np.sum(np.diag(self.G)**2)) / 2
+
+    def _rows(self, j, a, b):
+        # the change in the inner products of column j with every column.
+        diff = (self.C[b, j] - self.C[a, j])[:, None] * (self.C[a] - self.C[b])
+        diff[:, j] = 0
+        return diff
+
+    def deltas(self, j, a, b):
+        """
+        Return the change in the criterion from exchanging the levels of rows
+        `a` and `b` in column `j`, vectorized over the candidates `a`, `b`.
+        """
+        diff = self._rows(j, a, b)
+        return np.sum(diff * (2 * self.G[j] + diff), axis=1)
+
+    def exchange(self, j, a, b):
+        """
+        Exchange the levels of rows `a` and `b` in column `j`.
+        """
+        diff = self._rows(j, np.array([a]), np.array([b]))[0]
+        self.value += np.sum(diff * (2 * self.G[j] + diff))
+        self.G[j] += diff
+        self.G[:, j] = self.G[j]
+        self.P[[a, b], j] = self.P[[b, a], j]
+        self.C[[a, b], j] = self.C[[b, a], j]
+
+
+class Centered(object):
+    """
+    The squared centred L2 discrepancy of Hickernell for the centres of the
+    cells given by the levels `P`. This keeps the per-point products of its
+    first sum and the pairwise products of its second sum, so that an
+    exchange only needs to update two rows; see Jin et al. (2005).
+    """
+    def __init__(self, P):
+        n, d = P.shape
+        self.P = P
+        self.X = (P + 0.5) / n
+        Z = np.abs(self.X - 0.5)
+        self.F = np.prod(1 + Z/2 - Z**2/2, axis=1)
+        self.M = np.ones((n, n))
+        for k in xrange(d):
+            self.M *= self._pair(self.X[:, k, None], self.X[:, k])
+        self.value = ((13/12)**d - 2 * np.sum(self.F) / n
+                      + np.sum(self.M) / n**2)
+
+    @staticmethod
+    def _pair(x, y):
+        return 1 + (np.abs(x - 0.5) + np.abs(y - 0.5) - np.abs(x - y)) / 2
+
+    def _rows(self, j, a, b):
+        # the ratios by which the first product of rows a and b and the
+        # pairwise products of rows a and b with every other row change.
+        col = self.X[:, j]
+        xa, xb = col[a, None], col[b, None]
+        za, zb = np.abs(xa - 0.5), np.abs(xb - 0.5)
+        fa, fb = 1 + za/2 - za**2/2, 1 + zb/2 - zb**2/2
+        ga, gb = self._pair(xa, col), self._pair(xb, col)
+        rows = np.arange(len(col))
+        mask = (rows == a[:, None]) | (rows == b[:, None])
+        ra = np.where(mask, 1, gb / ga)
+        rb = np.where(mask, 1, ga / gb)
+        return fb / fa, (1 + zb) / (1 + za), ra, rb
+
+    def deltas(self, j, a, b):
+        """
+        Return the change in the criterion from exchanging the levels of rows
+        `a` and `b` in column `j`, vectorized over the candidates `a`, `b`.
+        """
+        n = len(self.P)
+        f, g, ra, rb = self._rows(j, a, b)
+        f, g = f[:, 0], g[:, 0]
+        dF = self.F[a] * (f - 1) + self.F[b] * (1/f - 1)
+        dM = (2 * np.sum(self.M[a] * (ra - 1) + self.M[b] * (rb - 1), axis=1)
+              + self.M[a, a] * (g - 1) + self.M[b, b] * (1/g - 1))
+        return -2 * dF / n + dM / n**2
+
+    def exchange(self, j, a, b):
+        """
+        Exchange the levels of rows `a` and `b` in column `j`.
+        """
+        self.value += self.deltas(j, np.array([a]), np.array([b]))[0]
+        f, g, ra, rb = self._rows(j, np.array([a]), np.array([b]))
+        self.F[a] *= f[0, 0]
+        self.F[b] /= f[0, 0]
+        self.M[a] *= ra[0]
+        self.M[b] *= rb[0]
+        self.M[:, a] = self.M[a]
+        self.M[:, b] = self.M[b]
+        self.M[a, a] *= g[0, 0]
+        self.M[b, b] /= g[0, 0]
+        self.P[[a, b], j] = self.P[[b, a], j]
+        self.X[[a, b], j] = self.X[[b, a], j]
+
+
+CRITERIA = {
+    'maximin': PhiP,
+    'correlation': Correlation,
+    'centered': Centered,
+}
+
+
+def optimize(P, criterion, rng, iterations):
+    """
+    Return a copy of the (n, d) matrix of levels `P`, whose columns are each
+    permutations of range(n), optimized with respect to the given criterion.
+
+    This is a simplified version of the enhanced stochastic evolutionary
+    algorithm of Jin et al. (2005): at each iteration a number of random
+    exchanges of two levels within a random column are evaluated, and the best
+    is accepted if it worsens the criterion by less than a random fraction of
+    a threshold which decreases to zero. Each exchange only changes the
+    distances from two points, so the change in the criterion is computed
+    incrementally in O(n) time for 'maximin' and 'centered' and O(d) time for
+    'correlation'.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError('unknown criterion for the latin hypercube')
+
+    n, d = P.shape
+    crit = CRITERIA[criterion](P.copy())
+    best, best_value = crit.P.copy(), crit.value
+
+    if n < 2:
+        return best
+
+    threshold = THRESHOLD * abs(crit.value)
+    for i in xrange(iterations):
+        j = rng.randint(d)
+        a = rng.randint(n, size=CANDIDATES)
+        b = (a + rng.randint(1, n, size=CANDIDATES)) % n
+        delta = crit.deltas(j, a, b)
+        k = np.argmin(delta)
+
+        if delta[k] <= threshold * (1 - i / iterations) * rng.rand():
+            crit.exchange(j, a[k], b[k])
+            if crit.value < best_value:
+                best, best_value = crit.P.copy(), crit.value
+
+    return best
@@ -0,0 +1,59 @@
+"""
+Generation of points from an extensible rank-1 lattice.
+"""
+
+# future imports
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+# global imports
+import os
+import numpy as np
+
+# local imports
+from ._sobol import LRUCache
+
+# the generating vector supports embedded lattices of up to 2**BITS points.
+BITS = 20
+
+
+def load_vector():
+    """
+    Return the generating vector lattice-33002-1024-1048576.9125 of Kuo, which
+    was constructed for embedded lattices with between 2**10 and 2**20 points
+    in up to 9125 dimensions, as a memory-mapped uint32 array.
+    """
+    path = os.path.join(os.path.dirname(__file__), 'data', 'lattice.npy')
+    return np.load(path, mmap_mode='r')
+
+
+# make sure the vector is only opened once.
+load_vector = LRUCache(load_vector, maxsize=1)
+
+
+def generate(d, start, n):
+    """
+    Return the `n` points with indices `start`, ..., `start+n-1` of the
+    `d`-dimensional lattice sequence as an (n, d) array. Point k is given by
+    frac(phi(k) * z) where phi is the base-2 radical inverse, so for every m
+    the first 2**m points form a rank-1 lattice rule with generating vector z.
+    """
+    z = load_vector()
+
+    if not 1 <= d <= len(z):
+        raise ValueError('the dimension must be between 1 and %d' % len(z))
+    if start + n > 2**BITS:
+        raise ValueError('only the first 2**%d points can be generated' % BITS)
+
+    # reverse the bits of each index, so that k -> phi(k) * 2**BITS.
+    k = np.arange(start, start+n, dtype=np.uint64)
+    r = np.zeros_like(k)
+    for j in xrange(BITS):
+        r |= ((k >> np.uint64(j)) & np.uint64(1)) << np.uint64(BITS-j-1)
+
+    # computing frac(phi(k) * z) requires only an integer multiply and mod.
+    X = r[:, None] * z[:d].astype(np.uint64)
+    X &= np.uint64(2**BITS - 1)
+
+    return X * 0.5**BITS
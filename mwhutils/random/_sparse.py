@@ -0,0 +1,99 @@
+"""
+Smolyak sparse grids formed using the combination technique.
+"""
+
+# future imports
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+
+# global imports
+import math
+import numpy as np
+from functools import reduce
+
+
+def clenshaw_curtis(i):
+    """
+    Return the nodes and weights in [0, 1] of the ith Clenshaw-Curtis rule,
+    which uses the single midpoint for i=1 and otherwise the 2**(i-1)+1
+    Chebyshev extrema. The rules are nested, and the nodes are computed so
+    that those shared between levels, including the midpoint, are identical.
+    """
+    if i == 1:
+        return np.array([0.5]), np.array([1.0])
+
+    m = 2**(i-1)
+    t = np.arange(m+1) / m
+    x = (1 + np.sin(np.pi * (t - 0.5))) / 2
+
+    # the weights, from the expansion of the integrand in cosines.
+    k = np.arange(1, m//2 + 1)
+    b = np.where(2*k == m, 1, 2) / (4*k**2 - 1)
+    w = 1 - np.dot(np.cos(2 * np.pi * np.outer(t, k)), b)
+    w *= np.where((t == 0) | (t == 1), 1, 2) / m
+
+    return x, w / 2
+
+
+def gauss_legendre(i):
+    """
+    Return the nodes and weights in [0, 1] of the Gauss-Legendre rule with
+    2**i-1 nodes. This is exact for polynomials of degree 2**(i+1)-3, and so
+    is at least as exact as the ith Clenshaw-Curtis rule (degree 2**(i-1)+1
+    for i > 1), but isn't nested.
+    """
+    x, w = np.polynomial.legendre.leggauss(2**i - 1)
+    return (x + 1) / 2, w / 2
+
+
+RULES = {
+    'clenshaw-curtis': clenshaw_curtis,
+    'gauss-legendre': gauss_legendre,
+}
+
+
+def multi_indices(d, total):
+    """
+    Iterate over the d-tuples of positive integers which sum to `total`.
+    """
+    if d == 1:
+        yield (total,)
+        return
+    for i in xrange(1, total - d + 2):
+        for rest in multi_indices(d - 1, total - i):
+            yield (i,) + rest
+
+
+def smolyak(d, level, rule='clenshaw-curtis'):
+    """
+    Return the points of the `d`-dimensional Smolyak sparse grid with the
+    given `level` in [0, 1]**d and their quadrature weights. With q=d+level
+    the sparse grid combines the tensor products of the 1d rules with indices
+    i where q-d+1 <= |i| <= q, each weighted by (-1)**(q-|i|) *
+    binom(d-1, q-|i|); points shared between the products are merged by
+    summing their weights.
+    """
+    if rule not in RULES:
+        raise ValueError('unknown quadrature rule')
+    if level < 0:
+        raise ValueError('the level must be non-negative')
+
+    rule = RULES[rule]
+    q = d + level
+    X, W = [], []
+
+    for total in xrange(max(d, q - d + 1), q + 1):
+        k = q - total
+        coef = (-1)**k * math.factorial(d - 1) // (math.factorial(k) *
+                                                   math.factorial(d - 1 - k))
+        for index in multi_indices(d, total):
+            nodes, weights = zip(*[rule(i) for i in index])
+            grids = np.meshgrid(*nodes, indexing='ij')
+            X.append(np.reshape(grids, (d, -1)).T)
+            W.append(coef * reduce(np.multiply.outer, weights).ravel())
+
+    X, k = np.unique(np.concatenate(X), axis=0, return_inverse=True)
+    W = np.bincount(k, weights=np.concatenate(W))
+
+    return X, W
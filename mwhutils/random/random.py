@@ -7,14 +7,22 @@ from __future__ import division
 from __future__ import absolute_import
 from __future__ import print_function
 
-# local imports
-from ._sobol import i4_sobol_generate
-
 # global imports
+import contextlib
+import numbers
 import numpy as np
 
+# NOTE: the sequence backends (._sobol, ._halton, ._lattice), the latin
+# hypercube optimizer (._latin), the sparse grids (._sparse) and the thread
+# pool are imported by the functions that use them, so that importing this
+# module doesn't pay for them unless they are needed.
+
 # exported symbols
-__all__ = ['rstate', 'uniform', 'latin', 'sobol', 'grid']
+__all__ = ['rstate', 'uniform', 'latin', 'sobol', 'iter_sobol', 'halton',
+           'lattice', 'grid', 'Grid', 'sparse_grid', 'SobolEngine']
+
+# descriptions of the kinds of output types accepted by _output.
+KINDS = {'f': 'floating point', 'u': 'unsigned integer'}
 
 
 def rstate(rng=None):
@@ -33,10 +41,12 @@ def rstate(rng=None):
     raise ValueError('unknown seed given to rstate')
 
 
-def uniform(bounds, n, rng=None):
+def uniform(bounds, n, rng=None, out=None, dtype=np.float64):
     """
     Sample n points uniformly at random from the specified region, given by
-    a list of [(lo,hi), ..] bounds in each dimension.
+    a list of [(lo,hi), ..] bounds in each dimension. If given, the points are
+    written into the (n, d) array `out`; otherwise a new array of the given
+    floating point `dtype` is returned.
     """
     # if given a seed or an instantiated RandomState make sure that we use
     # it here, but also within the sample_spectrum code.
@@ -46,62 +56,651 @@ def uniform(bounds, n, rng=None):
     # generate the random values.
     d = len(bounds)
     w = bounds[:, 1] - bounds[:, 0]
-    X = bounds[:, 0] + w * rng.rand(n, d)
+    X = _output(out, n, d, dtype)
+    np.multiply(rng.rand(n, d), w, out=X)
+    X += bounds[:, 0]
 
     return X
 
 
-def latin(bounds, n, rng=None):
+def latin(bounds, n, rng=None, criterion=None, iterations=1000, out=None,
+          dtype=np.float64):
     """
     Sample n points from a latin hypercube within the specified region, given
-    by a list of [(lo,hi), ..] bounds in each dimension.
+    by a list of [(lo,hi), ..] bounds in each dimension. If given, the points
+    are written into the (n, d) array `out`; otherwise a new array of the given
+    floating point `dtype` is returned.
+
+    By default the cells of the hypercube are assigned randomly. Otherwise the
+    assignment is optimized for `iterations` iterations with respect to one
+    of the following criteria, after which each point is still placed
+    uniformly at random within its cell:
+
+        - 'maximin': spread the points out by maximizing the distance between
+          the closest pair (using the phi_p criterion of Morris and Mitchell).
+        - 'correlation': minimize the correlations between dimensions.
+        - 'centered': minimize the centered L2 discrepancy.
     """
     rng = rstate(rng)
     bounds = np.array(bounds, ndmin=2, copy=False)
 
-    # generate the random samples.
     d = len(bounds)
     w = bounds[:, 1] - bounds[:, 0]
-    X = bounds[:, 0] + w * (np.arange(n)[:, None] + rng.rand(n, d)) / n
+    X = _output(out, n, d, dtype)
+
+    if criterion is None:
+        # generate the random samples and shuffle each dimension in place.
+        # This works on the transpose so that each dimension is contiguous,
+        # and the result is only copied into X once.
+        U = rng.rand(d, n)
+        U += np.arange(n)
+        for u in U:
+            rng.shuffle(u)
+
+        X[...] = U.T
+        X *= w
+        X /= n
+        X += bounds[:, 0]
+
+    else:
+        from ._latin import optimize
 
-    # shuffle each dimension.
-    for i in xrange(d):
-        X[:, i] = rng.permutation(X[:, i])
+        # optimize the cell of each point and then jitter it within the cell.
+        P = np.argsort(rng.rand(n, d), axis=0)
+        P = optimize(P, criterion, rng, iterations)
+        X[...] = rng.rand(n, d)
+        X += P
+        X *= w
+        X /= n
+        X += bounds[:, 0]
 
     return X
 
 
-def sobol(bounds, n, rng=None):
+def sobol(bounds, n, rng=None, scramble=False, workers=1, out=None,
+          dtype=np.float64):
     """
     Sample n points from a sobol sequence within the specified region, given by
-    a list of [(lo,hi), ..] bounds in each dimension.
+    a list of [(lo,hi), ..] bounds in each dimension. By default the sequence
+    is randomized by skipping a random number of initial points; otherwise
+    `scramble` can be used to select one of the randomizations implemented by
+    `SobolEngine`. If `workers` is greater than one the points are generated in
+    parallel, with identical results. If given, the points are written into
+    the (n, d) array `out`; otherwise a new array of the given floating point
+    `dtype` is returned.
     """
-    rng = rstate(rng)
     bounds = np.array(bounds, ndmin=2, copy=False)
+    X = _output(out, n, len(bounds), dtype)
+    engine = _sobol_engine(len(bounds), n, rng, scramble)
 
     # generate the random samples.
-    d = len(bounds)
-    skip = rng.randint(100, 200)
     w = bounds[:, 1] - bounds[:, 0]
-    X = bounds[:, 0] + w * i4_sobol_generate(d, n, skip).T
+    X = engine.draw(n, workers, X)
+    X *= w
+    X += bounds[:, 0]
 
     return X
 
 
-def grid(bounds, n):
+def iter_sobol(bounds, n, chunk=2**16, rng=None, scramble=False, workers=1,
+               dtype=np.float64):
+    """
+    Iterate over the same n points as `sobol` in contiguous (chunk, d) blocks
+    of the given `dtype`, where the last block may be smaller. Only one block
+    is held in memory at a time, which allows for very large numbers of
+    points. If `workers` is greater than one each block is generated in
+    parallel.
+    """
+    # the arguments are checked and the engine is created here, rather than
+    # in the generator, so that errors are raised by the call itself.
+    bounds = np.array(bounds, ndmin=2, copy=False)
+    dtype = _check_kind(dtype)
+    if chunk <= 0:
+        raise ValueError('the chunk size must be positive')
+    engine = _sobol_engine(len(bounds), n, rng, scramble)
+
+    return _iter_sobol(engine, bounds, n, chunk, workers, dtype)
+
+
+def _iter_sobol(engine, bounds, n, chunk, workers, dtype):
+    """
+    Generator implementing `iter_sobol` for the given engine.
+    """
+    w = bounds[:, 1] - bounds[:, 0]
+
+    # the same threads are used for every block.
+    with _thread_pool(workers) as pool:
+        for i in xrange(0, n, chunk):
+            X = engine._draw(min(chunk, n-i), workers, pool, None, dtype)
+            X *= w
+            X += bounds[:, 0]
+            yield X
+
+
+def _sobol_engine(d, n, rng, scramble):
+    """
+    Return the engine used by `sobol` and `iter_sobol` to sample n points.
+    """
+    rng = rstate(rng)
+
+    # the first 2**30 points are the same for any number of bits, so only use
+    # 64-bit integers if we need more points than that.
+    skip = 0 if scramble else rng.randint(100, 200) - 1
+    bits = 30 if skip + n <= 2**30 else 64
+
+    return SobolEngine(d, scramble, rng, bits).fast_forward(skip)
+
+
+def halton(bounds, n, rng=None, scramble=False, out=None, dtype=np.float64):
+    """
+    Sample n points from a Halton sequence within the specified region, given
+    by a list of [(lo,hi), ..] bounds in each dimension, where dimension i uses
+    the ith prime as its base. As with `sobol` the sequence is randomized by
+    skipping a random number of initial points unless `scramble` is true, in
+    which case each digit of each dimension is permuted by an independent
+    random linear permutation (random linear digit scrambling). If given, the
+    points are written into the (n, d) array `out`; otherwise a new array of
+    the given floating point `dtype` is returned.
+    """
+    from ._halton import primes, scramble_digits
+    from ._halton import generate as halton_generate
+
+    rng = rstate(rng)
+    bounds = np.array(bounds, ndmin=2, copy=False)
+
+    d = len(bounds)
+    bases = primes(d)
+
+    if scramble:
+        skip = 0
+        mult, shift = scramble_digits(bases, rng)
+    else:
+        skip = rng.randint(100, 200)
+        mult, shift = None, None
+
+    X = _output(out, n, d, dtype)
+    U = halton_generate(bases, skip, n, mult, shift)
+    _scale(U, bounds, X)
+
+    return X
+
+
+def lattice(bounds, n, rng=None, out=None, dtype=np.float64):
+    """
+    Sample n points from a randomly shifted rank-1 lattice within the
+    specified region, given by a list of [(lo,hi), ..] bounds in each
+    dimension. The points are ordered so that for any m the first 2**m points
+    form a lattice rule, and the first points drawn for a given `rng` don't
+    depend on n. If given, the points are written into the (n, d) array `out`;
+    otherwise a new array of the given floating point `dtype` is returned.
+    """
+    from ._lattice import generate as lattice_generate
+
+    rng = rstate(rng)
+    bounds = np.array(bounds, ndmin=2, copy=False)
+
+    d = len(bounds)
+    X = _output(out, n, d, dtype)
+    U = lattice_generate(d, 0, n)
+    U += rng.rand(d)
+    U %= 1
+    _scale(U, bounds, X)
+
+    return X
+
+
+def grid(bounds, n, out=None, dtype=np.float64, spacing='linear'):
     """
     Generate a regular grid within the specified region, given by `bounds`,
     a list of [(lo,hi), ..] bounds in each dimension. `n` represents the number
-    of points along each dimension.
+    of points along each dimension, either as a single count or as a sequence
+    of counts per dimension, and `spacing` gives their placement, either for
+    all dimensions or as a sequence, as one of:
+
+        - 'linear': equally spaced points.
+        - 'log': points equally spaced on a log scale, for positive bounds.
+        - 'chebyshev': the Chebyshev extrema, which cluster at the bounds.
+
+    If given, the points are written into the (N, d) array `out`, where N is
+    the product of the counts; otherwise a new array of the given floating
+    point `dtype` is returned. See `Grid` for grids which are too large to
+    hold in memory.
     """
     bounds = np.array(bounds, ndmin=2, copy=False)
     d = len(bounds)
+    values = _grid_axes(bounds, n, spacing)
+    counts = [len(v) for v in values]
+    X = _output(out, int(np.prod(counts)), d, dtype)
 
-    if d == 1:
-        X = np.linspace(bounds[0, 0], bounds[0, 1], n)
-        X = np.reshape(X, (-1, 1))
-    else:
-        X = np.meshgrid(*(np.linspace(a, b, n) for a, b in bounds))
-        X = np.reshape(X, (d, -1)).T
+    # the points are ordered as if constructed by np.meshgrid, ie the second
+    # dimension varies slowest followed by the first and then the rest. Each
+    # column is filled by broadcasting over a view with one axis per dimension.
+    axes = _grid_order(d)
+    full = [counts[i] for i in np.argsort(axes)]
+
+    for i, v in enumerate(values):
+        shape = [1] * d
+        shape[axes[i]] = counts[i]
+        column = X[:, i]
+        column.shape = full
+        column[...] = v.reshape(shape)
 
     return X
+
+
+class Grid(object):
+    """
+    Lazy version of the regular grid returned by `grid`, with the same
+    arguments, whose points are only computed when they are accessed. Grids
+    support `len` and indexing by integers, slices, integer arrays or boolean
+    masks with the same point order as `grid`, where each point is computed
+    from the mixed-radix digits of its index, and `chunks` iterates over the
+    points in bounded memory.
+    """
+    def __init__(self, bounds, n, dtype=np.float64, spacing='linear'):
+        bounds = np.array(bounds, ndmin=2, copy=False)
+        self.dim = len(bounds)
+        self.dtype = np.dtype(dtype)
+        self._axes = [v.astype(dtype) for v in _grid_axes(bounds, n, spacing)]
+        self.counts = [len(v) for v in self._axes]
+
+        # the dimensions in order from the slowest to the fastest varying.
+        self._order = np.argsort(_grid_order(self.dim))
+
+        # the number of points as a python integer, since len() is limited to
+        # 2**63-1 and so can't be used internally. The indices of larger grids
+        # are held in object arrays of python integers.
+        self._size = 1
+        for m in self.counts:
+            self._size *= int(m)
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        if isinstance(key, (bool, np.bool_)):
+            raise IndexError('grids cannot be indexed by a single boolean')
+
+        if isinstance(key, numbers.Integral):
+            k = key + self._size if key < 0 else key
+            if not 0 <= k < self._size:
+                raise IndexError('grid index out of range')
+            return self._points(np.array([k]))[0]
+
+        if isinstance(key, slice):
+            start, stop, step = _slice_indices(key, self._size)
+            if step == 1:
+                return self._block(start, max(stop - start, 0))
+            m = max(0, (stop - start + step - (1 if step > 0 else -1)) // step)
+            return self._points(start + step * self._indices(m))
+
+        k = np.asarray(key)
+        if k.dtype == bool:
+            if k.shape != (self._size,):
+                raise IndexError('the boolean mask must have one element '
+                                 'per point')
+            return self._points(np.flatnonzero(k))
+
+        if k.dtype.kind not in 'iuO':
+            raise IndexError('grid indices must be integers')
+        k = np.array(k, ndmin=1).astype(self._indices(0).dtype)
+        k[k < 0] += self._size
+        if np.any((k < 0) | (k >= self._size)):
+            raise IndexError('grid index out of range')
+        return self._points(k)
+
+    def chunks(self, size=2**16):
+        """
+        Iterate over the points in contiguous (size, dim) blocks, where the
+        last block may be smaller.
+        """
+        i = 0
+        while i < self._size:
+            yield self._block(i, min(size, self._size - i))
+            i += size
+
+    def _block(self, start, m):
+        """
+        Return the `m` points with indices starting at `start`. Within a
+        contiguous block each digit of the index is constant over runs of
+        known length, so the points are formed by repeating the values of
+        each axis rather than by dividing the indices.
+        """
+        X = np.empty((m, self.dim), self.dtype)
+        if m == 0:
+            return X
+
+        p = 1
+        for i in self._order[::-1]:
+            # the runs of the digit with place value p which cover the block.
+            # Only the first and last runs can be longer than the block, so
+            # the run lengths fit in 64 bits even if p doesn't.
+            a, b = start // p, (start + m - 1) // p
+            if a == b:
+                counts = [m]
+            else:
+                counts = np.full(b - a + 1, min(p, m), dtype=np.int64)
+                counts[0] = p - start % p
+                counts[-1] = (start + m - 1) % p + 1
+            j = (a % self.counts[i] + np.arange(b - a + 1)) % self.counts[i]
+            X[:, i] = np.repeat(self._axes[i][j], counts)
+            p *= self.counts[i]
+        return X
+
+    def _indices(self, m):
+        """
+        Return the indices 0, ..., m-1 as an array which can also hold the
+        indices of every point of the grid.
+        """
+        if self._size - 1 > np.iinfo(np.int64).max:
+            return np.array(list(range(m)), dtype=object)
+        return np.arange(m, dtype=np.int64)
+
+    def _points(self, k):
+        """
+        Return the points with the given array of (non-negative) indices,
+        which is an object array of python integers for indices which don't
+        fit in 64 bits.
+        """
+        X = np.empty((len(k), self.dim), self.dtype)
+        for i in self._order[::-1]:
+            if k.dtype == object:
+                k, j = k // self.counts[i], (k % self.counts[i]).astype(int)
+            else:
+                k, j = np.divmod(k, self.counts[i])
+            X[:, i] = self._axes[i][j]
+        return X
+
+
+def sparse_grid(bounds, level, rule='clenshaw-curtis'):
+    """
+    Generate a Smolyak sparse grid within the specified region, given by
+    `bounds`, a list of [(lo,hi), ..] bounds in each dimension. Return the
+    (N, d) array of points and their N quadrature weights, so that np.dot(w,
+    f(X)) approximates the integral of f over the region. The number of
+    points grows only as O(n log(n)**(d-1)), where n is the number of points
+    of the 1d rules, so these remain usable in high dimensions.
+
+    The grid of the given `level` integrates polynomials of total degree up
+    to 2*level+1 exactly, where level 0 is the single midpoint, and is formed
+    from the 1d rules given by `rule`, one of:
+
+        - 'clenshaw-curtis': nested rules with 1, 3, 5, 9, ... points,
+          including the bounds.
+        - 'gauss-legendre': rules with 1, 3, 7, 15, ... points, which aren't
+          nested and so give larger grids.
+    """
+    from ._sparse import smolyak
+
+    bounds = np.array(bounds, ndmin=2, copy=False)
+    w = bounds[:, 1] - bounds[:, 0]
+
+    X, weights = smolyak(len(bounds), level, rule)
+    X *= w
+    X += bounds[:, 0]
+    weights *= np.prod(w)
+
+    return X, weights
+
+
+class SobolEngine(object):
+    """
+    Stateful generator for the `dim`-dimensional Sobol sequence in the unit
+    cube, where successive calls to `draw` continue the sequence from where
+    the previous call left off. The integer state has `bits` bits, which
+    allows up to 2**bits points; up to 32 bits are stored as uint32 and up to
+    64 bits as uint64.
+
+    The sequence can be randomized using `rng` by setting `scramble` to one
+    of:
+
+        - 'lms' or True: a random linear matrix scrambling followed by a
+          random digital shift.
+        - 'owen': a nested uniform scrambling, where the flip applied to each
+          bit is a random function of the bits above it.
+    """
+    def __init__(self, dim, scramble=False, rng=None, bits=30):
+        from ._sobol import directions, random_bits, scramble_directions
+        from ._sobol import reverse_directions
+
+        if scramble not in (False, None, True, 'lms', 'owen'):
+            raise ValueError('unknown scrambling method')
+
+        self.dim = dim
+        self.index = 0
+        self._V = directions(dim, bits)
+        self._shift = None
+        self._seeds = None
+
+        if scramble in (True, 'lms'):
+            rng = rstate(rng)
+            self._V = scramble_directions(self._V, rng)
+            self._shift = random_bits(rng, dim, self._V.dtype, bits)
+
+        elif scramble == 'owen':
+            rng = rstate(rng)
+            dtype = self._V.dtype
+            self._seeds = random_bits(rng, dim, dtype, 8 * dtype.itemsize)
+
+            # generate the bit-reversed points, which are what the scrambling
+            # works on, so that they don't have to be reversed first.
+            self._V = reverse_directions(self._V)
+
+    def reset(self):
+        """
+        Return to the start of the sequence.
+        """
+        self.index = 0
+        return self
+
+    def fast_forward(self, k):
+        """
+        Skip the next `k` points of the sequence. Since each point is computed
+        directly from its index this does no work.
+        """
+        if k < 0:
+            raise ValueError('cannot fast-forward by a negative number of '
+                             'points')
+        self.index += k
+        return self
+
+    def draw(self, n, workers=1, out=None, dtype=np.float64):
+        """
+        Return the next `n` points of the sequence as an (n, dim) array, which
+        is written into `out` if given. The points are floats of the given
+        `dtype` unless it is an unsigned integer type, in which case the raw
+        integer coordinates are returned; these must be scaled by 2**-bits.
+
+        If `workers` is greater than one the points are split into contiguous
+        blocks which a pool of threads writes into the output in parallel;
+        since each point only depends on its index the result is identical.
+        """
+        return self._draw(n, workers, None, out, dtype)
+
+    def _draw(self, n, workers, pool, out, dtype):
+        """
+        Implementation of `draw` which takes the threads from `pool`, if
+        given, rather than creating a new pool.
+        """
+        X = _output(out, n, self.dim, dtype, kinds='fu')
+        bits = self._V.shape[1]
+
+        if X.dtype.kind == 'u' and 8 * X.dtype.itemsize < bits:
+            raise ValueError('%s cannot hold %d-bit integers'
+                             % (X.dtype, bits))
+
+        from ._sobol import BLOCK
+
+        # the points are generated in blocks of rows so that the temporary
+        # integer arrays are bounded in size and stay in cache.
+        rows = max(1, BLOCK // max(self.dim, 1))
+
+        def fill(a, b):
+            for i in xrange(a, b, rows):
+                j = min(i + rows, b)
+                self._points(self.index + i, X[i:j])
+
+        _parallel(fill, n, workers, pool)
+        self.index += n
+
+        return X
+
+    def _points(self, start, out):
+        """
+        Write the points with indices starting at `start` into the array
+        `out`, as floats or as raw integers for an unsigned integer type.
+        """
+        from ._sobol import generate, owen_scramble, to_unit
+
+        X = generate(self._V, start, len(out))
+        if self._shift is not None:
+            X ^= self._shift
+        if self._seeds is not None:
+            owen_scramble(X, self._seeds, self._V.shape[1])
+        if out.dtype.kind == 'u':
+            out[...] = X
+        else:
+            to_unit(X, self._V.shape[1], out=out)
+
+
+def _output(out, n, d, dtype=np.float64, kinds='f'):
+    """
+    Return the array `out` after checking that it has shape (n, d), or a new
+    such array of the given type if `out` is None. In either case the type
+    must be one of the given `kinds`, which defaults to floating point.
+    """
+    dtype = _check_kind(dtype if out is None else out.dtype, kinds)
+    if out is None:
+        return np.empty((n, d), dtype)
+    if out.shape != (n, d):
+        raise ValueError('the output array must have shape (%d, %d)' % (n, d))
+    return out
+
+
+def _check_kind(dtype, kinds='f'):
+    """
+    Return `dtype` as a numpy dtype after checking that it is one of the
+    given `kinds`.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind not in kinds:
+        raise ValueError('the output type must be %s, not %s'
+                         % (' or '.join(KINDS[k] for k in kinds), dtype))
+    return dtype
+
+
+def _scale(U, bounds, X):
+    """
+    Write the points `U` in the unit cube into the array `X` after scaling
+    them to the region given by `bounds`. The points are first capped so that
+    none can be rounded up to the upper bound in the type of `X`.
+    """
+    np.minimum(U, np.nextafter(X.dtype.type(1), X.dtype.type(0)), out=U)
+    np.multiply(U, bounds[:, 1] - bounds[:, 0], out=X)
+    X += bounds[:, 0]
+
+
+def _grid_axes(bounds, n, spacing):
+    """
+    Return the values taken by each dimension of a grid within `bounds`,
+    where `n` and `spacing` are either given for all dimensions or as
+    sequences with one element per dimension.
+    """
+    d = len(bounds)
+    counts = np.broadcast_to(n, d)
+    spacing = [spacing] * d if np.ndim(spacing) == 0 else spacing
+
+    if len(spacing) != d:
+        raise ValueError('the spacing must be given for each dimension')
+
+    values = []
+    for (a, b), m, kind in zip(bounds, counts, spacing):
+        if kind == 'linear':
+            v = np.linspace(a, b, m)
+        elif kind == 'log':
+            if a <= 0 or b <= 0:
+                raise ValueError('log spacing requires positive bounds')
+            v = np.exp(np.linspace(np.log(a), np.log(b), m))
+        elif kind == 'chebyshev':
+            t = np.arange(m) / max(m - 1, 1)
+            v = a + (b - a) * (1 - np.cos(np.pi * t)) / 2
+        else:
+            raise ValueError('unknown grid spacing')
+
+        # make sure the bounds are hit exactly.
+        if m > 0:
+            v[0] = a
+        if m > 1:
+            v[-1] = b
+        values.append(v)
+
+    return values
+
+
+def _slice_indices(key, size):
+    """
+    Return the start, stop and step of the slice `key` for a sequence with
+    `size` elements, as `slice.indices` does but for python integers of any
+    size.
+    """
+    step = 1 if key.step is None else key.step
+    if step == 0:
+        raise ValueError('slice step cannot be zero')
+    lo, hi = (0, size) if step > 0 else (-1, size - 1)
+
+    def clip(i, default):
+        if i is None:
+            return default
+        if i < 0:
+            i += size
+        return min(max(i, lo), hi)
+
+    if step > 0:
+        return clip(key.start, lo), clip(key.stop, hi), step
+    return clip(key.start, hi), clip(key.stop, lo), step
+
+
+def _grid_order(d):
+    """
+    Return the axis of the meshgrid-ordered grid of points corresponding to
+    each of the `d` dimensions, ie with the first two dimensions swapped.
+    """
+    axes = list(range(d))
+    axes[:2] = axes[1::-1]
+    return axes
+
+
+@contextlib.contextmanager
+def _thread_pool(workers):
+    """
+    Yield a pool of `workers` threads, or None if `workers` is at most one.
+    The threads are shut down and joined on exit.
+    """
+    if workers <= 1:
+        yield None
+        return
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(workers)
+    try:
+        yield pool
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _parallel(func, n, workers, pool=None):
+    """
+    Call `func(a, b)` on `workers` contiguous blocks [a, b) covering range(n)
+    in parallel if `workers` is greater than one. The threads are taken from
+    `pool` if given, and otherwise from a pool which only lasts for this call.
+    """
+    if workers <= 1 or n < 2 * workers:
+        func(0, n)
+    elif pool is None:
+        with _thread_pool(workers) as pool:
+            _parallel(func, n, workers, pool)
+    else:
+        edges = np.linspace(0, n, workers + 1).astype(int)
+        pool.map(lambda i: func(edges[i], edges[i+1]), xrange(workers))
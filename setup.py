@@ -11,4 +11,5 @@ setup(name='mwhutils',
       description='Python machine learning utilities',
       url='http://github.com/mwhoffman/mwhutils',
       license='Simplified BSD',
-      packages=find_packages())
+      packages=find_packages(),
+      package_data={'mwhutils.random': ['data/*.npy']})
@@ -10,7 +10,9 @@ import numpy as np
 import scipy.linalg as sla
 import numpy.testing as nt
 
-from mwhutils.linalg import chol_update
+from mwhutils.linalg import chol_robust, chol_update, chol_update_batch
+from mwhutils.linalg import chol_remove, chol_rank_update
+from mwhutils.linalg import IncrementalCholesky
 
 
 def test_chol_update():
@@ -27,3 +29,141 @@ def test_chol_update():
     x2 = sla.solve_triangular(R2, b, trans=True)
 
     nt.assert_allclose(x1, x2)
+
+
+def test_incremental_cholesky():
+    """Test the in-place incremental cholesky decomposition."""
+    A = np.random.rand(12, 12)
+    A = np.dot(A.T, A) + np.eye(12)
+    b = np.random.rand(12, 2)
+    R = sla.cholesky(A)
+    x = sla.solve_triangular(R, b, trans=True)
+
+    # grow the matrix in blocks of different sizes, starting with a capacity
+    # which is too small so that the buffers are reallocated.
+    chol = IncrementalCholesky(capacity=2)
+    for i, j in [(0, 1), (1, 4), (4, 5), (5, 12)]:
+        chol.update(A[:i, i:j], A[i:j, i:j], b[i:j])
+        nt.assert_allclose(chol.R, R[:j, :j])
+        nt.assert_allclose(chol.a, x[:j])
+    assert len(chol) == 12 and chol.capacity == 16
+
+    # start from an existing factor without tracking a.
+    chol = IncrementalCholesky(R[:3, :3])
+    chol.update(A[:3, 3:], A[3:, 3:])
+    nt.assert_allclose(chol.R, R)
+    assert chol.a is None
+    nt.assert_raises(ValueError, chol.update, A[:3, 3:], A[3:, 3:], b[3:])
+
+
+def test_chol_remove():
+    """Test removing rows and columns from a cholesky decomposition."""
+    A = np.random.rand(10, 10)
+    A = np.dot(A.T, A) + np.eye(10)
+    b = np.random.rand(10, 2)
+    R = sla.cholesky(A)
+    x = sla.solve_triangular(R, b, trans=True)
+
+    for idx in [[], [0], [9], [4, 2, 7], range(0, 10, 2)]:
+        keep = np.setdiff1d(np.arange(10), idx)
+        R2 = sla.cholesky(A[np.ix_(keep, keep)])
+        x2 = sla.solve_triangular(R2, b[keep], trans=True)
+
+        R1, x1 = chol_remove(R, x, idx)
+        nt.assert_allclose(R1, R2)
+        nt.assert_allclose(x1, x2)
+        nt.assert_equal(chol_remove(R, None, idx)[1], None)
+
+        chol = IncrementalCholesky(R, x).remove(idx)
+        nt.assert_allclose(chol.R, R2)
+        nt.assert_allclose(chol.a, x2)
+
+    # slide a window over the matrix using the incremental decomposition.
+    chol = IncrementalCholesky()
+    chol.update(A[:0, :4], A[:4, :4], b[:4])
+    for i in xrange(4, 10):
+        chol.remove([0])
+        chol.update(A[i-3:i, i:i+1], A[i:i+1, i:i+1], b[i:i+1])
+        R2 = sla.cholesky(A[i-3:i+1, i-3:i+1])
+        nt.assert_allclose(chol.R, R2)
+        nt.assert_allclose(chol.a, sla.solve_triangular(R2, b[i-3:i+1],
+                                                        trans=True))
+
+    nt.assert_raises(IndexError, chol_remove, R, x, [10])
+    nt.assert_raises(IndexError, IncrementalCholesky(R).remove, [-1])
+
+
+def test_chol_rank_update():
+    """Test low-rank updates and downdates of a cholesky decomposition."""
+    A = np.random.rand(10, 10)
+    A = np.dot(A.T, A) + np.eye(10)
+    R = sla.cholesky(A)
+
+    for U in [np.random.rand(10), np.random.rand(10, 3)]:
+        UU = np.dot(np.reshape(U, (10, -1)), np.reshape(U, (10, -1)).T)
+        R1 = chol_rank_update(R, U)
+        nt.assert_allclose(R1, sla.cholesky(A + UU))
+        nt.assert_allclose(chol_rank_update(R1, U, downdate=True), R)
+
+        # a downdate in place.
+        R2 = R.copy()
+        assert chol_rank_update(R2, U / 10, True, True) is R2
+        nt.assert_allclose(R2, sla.cholesky(A - UU / 100))
+
+    # downdating by more than the matrix itself should fail loudly.
+    nt.assert_raises(np.linalg.LinAlgError, chol_rank_update, R, 2 * R[0],
+                     True)
+
+
+def test_chol_update_batch():
+    """Test the batched incremental cholesky decomposition."""
+    A = np.random.rand(4, 6, 6)
+    A = np.matmul(A, np.swapaxes(A, 1, 2)) + np.eye(6)
+    b = np.random.rand(4, 6, 2)
+
+    R = np.array([sla.cholesky(A_[:4, :4]) for A_ in A])
+    for y in [b, b[..., 0]]:
+        x = np.array([sla.solve_triangular(R_, y_[:4], trans=True)
+                      for R_, y_ in zip(R, y)])
+        R1, x1 = chol_update_batch(R, A[:, :4, 4:], A[:, 4:, 4:], x, y[:, 4:])
+
+        for i in xrange(4):
+            R2, x2 = chol_update(R[i], A[i, :4, 4:], A[i, 4:, 4:], x[i],
+                                 y[i, 4:])
+            nt.assert_allclose(R1[i], R2)
+            nt.assert_allclose(x1[i], x2)
+
+
+def test_chol_robust():
+    """Test the jittered cholesky decompositions."""
+    A = np.random.rand(5, 5)
+    A = np.dot(A.T, A) + np.eye(5)
+    R, jitter = chol_robust(A)
+    nt.assert_allclose(R, sla.cholesky(A))
+    assert jitter == 0
+
+    # a singular matrix needs jitter, but a negative definite one fails.
+    B = np.ones((3, 3))
+    R, jitter = chol_robust(B)
+    assert jitter > 0
+    nt.assert_allclose(np.dot(R.T, R), B + jitter * np.eye(3))
+    nt.assert_raises(np.linalg.LinAlgError, chol_robust, -B)
+
+    # add two copies of the first row and column with a slightly smaller
+    # diagonal, so that their schur complement is indefinite.
+    b = np.random.rand(7)
+    idx = [0, 1, 2, 3, 4, 0, 0]
+    K = A[np.ix_(idx, idx)]
+    K[[5, 6], [5, 6]] -= 1e-6
+    R = sla.cholesky(A)
+    x = sla.solve_triangular(R, b[:5], trans=True)
+    nt.assert_raises(np.linalg.LinAlgError, chol_update, R, K[:5, 5:],
+                     K[5:, 5:], x, b[5:])
+
+    R1, x1, jitter = chol_update(R, K[:5, 5:], K[5:, 5:], x, b[5:], True)
+    K[[5, 6], [5, 6]] += jitter
+    R2 = sla.cholesky(K)
+    assert jitter > 0
+    nt.assert_allclose(R1, R2, atol=1e-10)
+    nt.assert_allclose(x1, sla.solve_triangular(R2, b, trans=True),
+                       rtol=1e-5)
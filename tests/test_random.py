@@ -6,10 +6,31 @@ from __future__ import division
 from __future__ import absolute_import
 from __future__ import print_function
 
+import subprocess
+import sys
+import threading
+import numpy as np
 import numpy.testing as nt
 
+from multiprocessing.pool import ThreadPool
+
 from mwhutils.random import rstate
-from mwhutils.random import uniform, latin, sobol, grid
+from mwhutils.random import uniform, latin, sobol, grid, Grid, sparse_grid
+from mwhutils.random import iter_sobol, halton, lattice, SobolEngine
+from mwhutils.random._sobol import i4_sobol, i4_sobol_generate
+from mwhutils.random._sobol import LRUCache, directions
+from mwhutils.random._sobol import bit_hi1, bit_lo0, reverse_bits
+from mwhutils.random._sobol import generate as generate_sobol
+from mwhutils.random._halton import primes, generate
+from mwhutils.random import _lattice, _latin
+
+
+def test_lazy_import():
+    """Test that the sequence backends are only imported when used."""
+    script = ('import sys, mwhutils.random; '
+              'sys.exit(any(m.startswith("mwhutils.random._") '
+              'for m in sys.modules))')
+    assert subprocess.call([sys.executable, '-c', script]) == 0
 
 
 def test_rstate():
@@ -38,10 +59,290 @@ def check_random(method):
 
 def test_random():
     """Test all the random generators."""
-    for method in [uniform, latin, sobol]:
+    for method in [uniform, latin, sobol, halton, lattice]:
         yield check_random, method
 
 
+def test_latin():
+    """Test the optimized latin hypercubes."""
+    bounds = np.array([(0, 1), (3, 5), (-1, 1)])
+
+    def mindist(X):
+        D = np.sum((X[:, None] - X[None]) ** 2, axis=-1)
+        return np.min(D[np.triu_indices(len(X), 1)])
+
+    def maxcorr(X):
+        return np.max(np.abs(np.corrcoef(X.T) - np.eye(X.shape[1])))
+
+    for criterion in [None, 'maximin', 'correlation', 'centered']:
+        X = latin(bounds, 20, 0, criterion, 200)
+        cells = (X - bounds[:, 0]) / (bounds[:, 1] - bounds[:, 0]) * 20
+        nt.assert_equal(np.sort(cells.astype(int), axis=0).T, [range(20)] * 3)
+
+    # the jitter within each cell means the criteria are only compared on the
+    # cells themselves.
+    P0 = np.argsort(np.random.RandomState(0).rand(20, 3), axis=0)
+    rng = np.random.RandomState(0)
+    P1 = _latin.optimize(P0, 'maximin', rng, 200)
+    P2 = _latin.optimize(P0, 'correlation', rng, 200)
+    P3 = _latin.optimize(P0, 'centered', rng, 200)
+    assert mindist(P1) > mindist(P0)
+    assert maxcorr(P2) < maxcorr(P0)
+    assert _latin.Centered(P3).value < _latin.Centered(P0).value
+
+    nt.assert_raises(ValueError, latin, bounds, 20, 0, 'foo')
+
+
+def test_iter_sobol():
+    """Test iterating over blocks of sobol points."""
+    bounds = [(0, 1), (3, 4), (-1, 1)]
+    for scramble in [False, 'owen']:
+        X = sobol(bounds, 1000, 1, scramble)
+        blocks = list(iter_sobol(bounds, 1000, 256, 1, scramble))
+        assert [len(block) for block in blocks] == [256, 256, 256, 232]
+        assert all(block.flags.c_contiguous for block in blocks)
+        nt.assert_equal(np.concatenate(blocks), X)
+
+    # the arguments should be checked when called, not when iterated over.
+    nt.assert_raises(ValueError, iter_sobol, bounds, 1000, 256,
+                     dtype=np.uint32)
+    nt.assert_raises(ValueError, iter_sobol, bounds, 100, 0)
+    nt.assert_raises(ValueError, iter_sobol, bounds, 100, -5)
+
+
+def test_sobol_workers():
+    """Test that parallel sobol generation matches the serial results."""
+    bounds = [(0, 1), (3, 4), (-1, 1)]
+    for scramble in [False, 'lms', 'owen']:
+        X = sobol(bounds, 1000, 1, scramble)
+        nt.assert_equal(sobol(bounds, 1000, 1, scramble, workers=4), X)
+        blocks = iter_sobol(bounds, 1000, 300, 1, scramble, workers=3)
+        nt.assert_equal(np.concatenate(list(blocks)), X)
+
+    # the worker threads should all have finished.
+    count = threading.active_count()
+    sobol(bounds, 1000, 1, workers=4)
+    list(iter_sobol(bounds, 1000, 300, 1, workers=3))
+    assert threading.active_count() == count
+
+
+def test_sobol_generate():
+    """Test the sobol generator against known values."""
+    X = np.array([[0.000, 0.000, 0.000, 0.000],
+                  [0.500, 0.500, 0.500, 0.500],
+                  [0.750, 0.250, 0.750, 0.250],
+                  [0.250, 0.750, 0.250, 0.750],
+                  [0.375, 0.375, 0.625, 0.125],
+                  [0.875, 0.875, 0.125, 0.625],
+                  [0.625, 0.125, 0.375, 0.375],
+                  [0.125, 0.625, 0.875, 0.875]])
+
+    nt.assert_equal(i4_sobol_generate(4, 8, 1), X.T)
+    nt.assert_equal(i4_sobol_generate(4, 4, 0), np.r_[X[:1], X[:3]].T)
+    for seed in xrange(8):
+        quasi, seed_ = i4_sobol(4, seed)
+        nt.assert_equal(quasi, X[seed])
+        assert seed_ == seed + 1
+
+    nt.assert_raises(ValueError, i4_sobol_generate, 4, 10, 2**30)
+
+
+def test_sobol_threads():
+    """Test that concurrent sobol calls match the serial results."""
+    args = [([(0, 1)] * (1 + i % 12), 200, i) for i in xrange(100)]
+    serial = [sobol(*arg) for arg in args]
+
+    directions.clear()
+    pool = ThreadPool(8)
+    parallel = pool.map(lambda arg: sobol(*arg), args)
+    pool.close()
+
+    for X, Y in zip(serial, parallel):
+        nt.assert_equal(X, Y)
+
+
+def test_sobol_directions():
+    """Test caching of the sobol direction numbers."""
+    V = directions(8)
+    assert V.shape == (8, 30)
+    assert directions(8) is V
+    assert directions(8, 30) is V
+    assert directions(8, 64) is not V
+    nt.assert_raises(ValueError, V.fill, 0)
+    nt.assert_raises(ValueError, directions, 0)
+
+    cache = LRUCache(lambda x: [x], maxsize=2)
+    a = cache(1)
+    b = cache(2)
+    assert cache(1) is a
+    cache(3)
+    assert cache(1) is a
+    assert cache(2) is not b
+    cache.clear()
+    assert cache(1) is not a
+
+    # calls with and without default arguments should share an entry.
+    cache = LRUCache(lambda x, y=2: [x, y], maxsize=1)
+    a = cache(1)
+    assert cache(1, 2) is a
+    assert cache.cache.keys() == [(1, 2)]
+
+
+def test_sobol_bit_helpers():
+    """Test the vectorized bit helpers."""
+    k = np.arange(1025)
+    nt.assert_equal(bit_hi1(k), [len(bin(i)) - 2 if i else 0 for i in k])
+    nt.assert_equal(bit_lo0(k), [len(bin(i+1 & ~i)) - 2 for i in k])
+
+    k = np.array([2**32-1, 2**32, 2**53+1, 2**64-1], dtype=np.uint64)
+    nt.assert_equal(bit_hi1(k), [32, 33, 54, 64])
+    nt.assert_equal(bit_lo0(k), [33, 1, 2, 0])
+
+    for dtype, bits in [(np.uint32, 32), (np.uint64, 64)]:
+        k = np.array([0, 1, 6, 2**31 + 5, 2**bits - 2], dtype=dtype)
+        r = [int('{:0{}b}'.format(int(i), bits)[::-1], 2) for i in k]
+        nt.assert_equal(reverse_bits(k), np.array(r, dtype=dtype))
+
+
+def test_sobol_engine():
+    """Test resuming and fast-forwarding the sobol engine."""
+    X = SobolEngine(5).draw(100)
+    nt.assert_equal(X, i4_sobol_generate(5, 100, 1).T)
+
+    engine = SobolEngine(5)
+    nt.assert_equal(np.r_[engine.draw(30), engine.draw(70)], X)
+    nt.assert_equal(engine.reset().fast_forward(40).draw(20), X[40:60])
+    assert engine.index == 60
+    nt.assert_raises(ValueError, engine.fast_forward, -5)
+    nt.assert_raises(ValueError, generate_sobol, directions(5), -5, 3)
+
+    X1 = SobolEngine(5, scramble=True, rng=1).draw(100)
+    X2 = SobolEngine(5, scramble=True, rng=1).draw(100)
+    nt.assert_equal(X1, X2)
+    assert np.all(X1 >= 0) and np.all(X1 < 1)
+    assert np.any(X1 != X)
+
+
+def test_sobol_bits():
+    """Test high-dimensional and 64-bit sobol sequences."""
+    X = SobolEngine(21201).draw(64)
+    cells = np.floor(X * 64).astype(int)
+    assert all(len(np.unique(c)) == 64 for c in cells.T)
+    nt.assert_raises(ValueError, SobolEngine, 21202)
+
+    # the first 2**30 points don't depend on the number of bits.
+    X1 = SobolEngine(10).fast_forward(1000).draw(100)
+    X2 = SobolEngine(10, bits=64).fast_forward(1000).draw(100)
+    nt.assert_equal(X1, X2)
+
+    engine = SobolEngine(10).fast_forward(2**30 - 1)
+    nt.assert_raises(ValueError, engine.draw, 2)
+
+    for scramble in [False, 'lms', 'owen']:
+        engine = SobolEngine(3, scramble, 1, bits=64)
+        X = engine.fast_forward(2**64 - 1024).draw(1024)
+        assert np.all(X >= 0) and np.all(X < 1)
+
+
+def test_sobol_scramble():
+    """Test that scrambling preserves the net structure of the sequence."""
+    for scramble in ['lms', 'owen']:
+        X1 = SobolEngine(6, scramble, 1).draw(1024)
+        X2 = SobolEngine(6, scramble, 1).draw(1024)
+        X3 = SobolEngine(6, scramble, 2).draw(1024)
+        nt.assert_equal(X1, X2)
+        assert np.any(X1 != X3)
+
+        # each 1d projection has one point per interval of width 1/1024 and
+        # the first two dimensions have one point per 32x32 cell.
+        cells = np.floor(X1 * 1024).astype(int)
+        assert all(len(np.unique(c)) == 1024 for c in cells.T)
+        cells = np.floor(X1[:, :2] * 32).astype(int)
+        assert len(np.unique(cells[:, 0] * 32 + cells[:, 1])) == 1024
+
+    X = sobol([(0, 1), (3, 4)], 10, rng=1, scramble='owen')
+    assert X.shape == (10, 2)
+    nt.assert_raises(ValueError, SobolEngine, 2, 'foo')
+
+
+def check_out(method, *args):
+    """Check that the method writes into a given output array."""
+    X = method(*args, rng=1)
+    for dtype in [np.float64, np.float32]:
+        out = np.empty(X.shape, dtype)
+        assert method(*args, rng=1, out=out) is out
+        nt.assert_allclose(out, X, rtol=1e-6)
+    nt.assert_raises(ValueError, method, *args, out=np.empty((1, 1)))
+    out = np.empty(X.shape, np.int64)
+    nt.assert_raises(ValueError, method, *args, out=out)
+
+
+def test_halton():
+    """Test the halton sequence."""
+    nt.assert_equal(primes(10), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+    nt.assert_equal(primes(1000)[-1], 7919)
+
+    X = generate(primes(2), 0, 6)
+    nt.assert_allclose(X[:, 0], [0, 1/2, 1/4, 3/4, 1/8, 5/8])
+    nt.assert_allclose(X[:, 1], [0, 1/3, 2/3, 1/9, 4/9, 7/9])
+
+    # scrambling should preserve the stratification of the sequence.
+    for scramble in [False, True]:
+        X = halton([(0, 1)] * 3, 2**3 * 3**3 * 5**2, 1, scramble)
+        cells = np.floor(X * [2**3, 3**3, 5**2]).astype(int)
+        for c, m in zip(cells.T, [8, 27, 25]):
+            assert len(np.unique(c)) == m
+
+    X1 = halton([(0, 1)] * 3, 100, 1, True)
+    X2 = halton([(0, 1)] * 3, 100, 1, True)
+    nt.assert_equal(X1, X2)
+
+
+def test_lattice():
+    """Test the extensible lattice sequence."""
+    assert _lattice.load_vector() is _lattice.load_vector()
+    z = _lattice.load_vector()[:5]
+    for m in [0, 4, 8]:
+        X = np.sort(_lattice.generate(5, 0, 2**m), axis=0)
+        Y = np.sort(np.outer(np.arange(2**m), z) % 2**m / 2**m, axis=0)
+        nt.assert_equal(X, Y)
+
+    X = lattice([(0, 1), (3, 4)], 100, 1)
+    nt.assert_equal(lattice([(0, 1), (3, 4)], 50, 1), X[:50])
+    nt.assert_raises(ValueError, _lattice.generate, 10000, 0, 1)
+    nt.assert_raises(ValueError, _lattice.generate, 2, 2**20, 1)
+
+
+def test_out():
+    """Test the output arrays of all the random generators."""
+    for method in [uniform, latin, sobol, halton, lattice]:
+        yield check_out, method, [(0, 1), (3, 4)], 10
+
+
+def test_dtype():
+    """Test the output types of the random generators."""
+    for method in [uniform, latin, sobol, halton, lattice]:
+        X = method([(0, 1), (3, 4)], 10, 1, dtype=np.float32)
+        assert X.dtype == np.float32
+        nt.assert_allclose(X, method([(0, 1), (3, 4)], 10, 1), rtol=1e-6)
+        nt.assert_raises(ValueError, method, [(0, 1)], 10, dtype=np.uint32)
+    assert grid([(0, 1), (3, 4)], 10, dtype=np.float32).dtype == np.float32
+    nt.assert_raises(ValueError, grid, [(0, 1)], 10, dtype=int)
+
+    # float32 sobol points should never be rounded up to one.
+    engine = SobolEngine(3, bits=64).fast_forward(2**64 - 100)
+    assert np.all(engine.draw(100, dtype=np.float32) < 1)
+
+    # the raw integers should give the same points once scaled.
+    engine = SobolEngine(3)
+    X = engine.draw(10, dtype=np.uint32)
+    assert X.dtype == np.uint32
+    nt.assert_equal(X * 0.5**30, engine.reset().draw(10))
+    nt.assert_raises(ValueError, SobolEngine(3, bits=64).draw, 3,
+                     dtype=np.uint32)
+    nt.assert_raises(ValueError, SobolEngine(3).draw, 3, dtype=np.int32)
+
+
 def test_grid():
     """Test the non-random grid "sampler"."""
     sample = grid([(0, 1), (3, 4)], 10)
@@ -52,3 +353,90 @@ def test_grid():
     sample = grid((0, 1), 10)
     assert sample.shape == (10, 1)
     assert all(sample[:, 0] >= 0) and all(sample[:, 0] <= 1)
+
+    # the ordering should match that of meshgrid.
+    out = np.empty((1000, 3), np.float32)
+    bounds = [(0, 1), (3, 4), (5, 6)]
+    X = np.meshgrid(*(np.linspace(a, b, 10) for a, b in bounds))
+    X = np.reshape(X, (3, -1)).T
+    assert grid(bounds, 10, out) is out
+    nt.assert_allclose(out, X, rtol=1e-6)
+
+    # per-dimension counts and spacings.
+    bounds = [(1, 100), (0, 1), (-1, 1)]
+    spacing = ['log', 'linear', 'chebyshev']
+    X = np.meshgrid([1, 10, 100], [0, 1], [-1, -0.5, 0.5, 1])
+    X = np.reshape(X, (3, -1)).T
+    nt.assert_allclose(grid(bounds, [3, 2, 4], spacing=spacing), X)
+    nt.assert_allclose(Grid(bounds, [3, 2, 4], spacing=spacing)[:], X)
+    nt.assert_allclose(grid([(1, 100)], 3, spacing=u'log')[:, 0], [1, 10, 100])
+    nt.assert_raises(ValueError, grid, [(0, 1)], 3, spacing='log')
+    nt.assert_raises(ValueError, grid, [(0, 1)], 3, spacing='foo')
+    nt.assert_raises(ValueError, grid, [(0, 1)], 3, spacing=['linear'] * 2)
+
+
+def test_grid_lazy():
+    """Test the lazy grid."""
+    bounds = [(0, 1), (3, 4), (5, 6)]
+    X = grid(bounds, 7)
+    G = Grid(bounds, 7)
+    assert len(G) == len(X)
+    nt.assert_equal(G[:], X)
+    nt.assert_equal(G[-1], X[-1])
+    nt.assert_equal(G[5:300:7], X[5:300:7])
+    nt.assert_equal(G[100:5], X[100:5])
+    nt.assert_equal(G[[3, -2, 10]], X[[3, -2, 10]])
+    nt.assert_equal(np.concatenate(list(G.chunks(100))), X)
+    nt.assert_raises(IndexError, G.__getitem__, len(X))
+    nt.assert_raises(IndexError, G.__getitem__, [0, -len(X)-1])
+
+    # boolean masks select points rather than being treated as indices.
+    mask = np.arange(len(X)) % 3 == 0
+    nt.assert_equal(G[mask], X[mask])
+    nt.assert_raises(IndexError, G.__getitem__, mask[:10])
+    nt.assert_raises(IndexError, G.__getitem__, True)
+    nt.assert_raises(IndexError, G.__getitem__, np.True_)
+
+    # points deep inside a large grid shouldn't need any earlier ones.
+    G = Grid([(0, 1)] * 9, 10)
+    nt.assert_allclose(G[123456789], np.r_[2, 1, 3:10] / 9)
+    nt.assert_equal(G[10**9-5:], G[range(10**9-5, 10**9)])
+
+    # grids with more points than len() allows can still be indexed.
+    G = Grid([(0, 1)] * 20, 10)
+    N = 10**20
+    nt.assert_allclose(G[N - 1], np.ones(20))
+    nt.assert_allclose(G[-1], np.ones(20))
+    nt.assert_allclose(G[N-3:][:, -1], [7/9, 8/9, 1])
+    nt.assert_equal(G[N-3:], G[[N-3, N-2, -1]])
+    nt.assert_equal(G[N-10::4], G[[N-10, N-6, N-2]])
+    nt.assert_equal(G[10**19-2:10**19+2], G[[10**19-2, 10**19-1, 10**19,
+                                              10**19+1]])
+    nt.assert_equal(next(G.chunks(4)), G[:4])
+    nt.assert_equal(next(G.chunks(4)), G[[0, 1, 2, 3]])
+
+
+def test_sparse_grid():
+    """Test the sparse grids."""
+    bounds = np.array([(0, 2), (-1, 1), (1, 4)])
+    lo, hi = bounds.T
+
+    # the number of points of the nested clenshaw-curtis grids.
+    for d, sizes in [(1, [1, 3, 5, 9]), (2, [1, 5, 13, 29]),
+                     (3, [1, 7, 25, 69])]:
+        for level, size in enumerate(sizes):
+            X, w = sparse_grid(bounds[:d], level)
+            assert X.shape == (size, d) and w.shape == (size,)
+
+    # polynomials of total degree up to 2*level+1 should be exact.
+    for rule in ['clenshaw-curtis', 'gauss-legendre']:
+        X, w = sparse_grid(bounds, 2, rule)
+        assert np.all(X >= lo) and np.all(X <= hi)
+        for p in [(0, 0, 0), (1, 2, 2), (0, 0, 5), (3, 1, 1)]:
+            p = np.array(p)
+            exact = np.prod((hi**(p+1) - lo**(p+1)) / (p+1))
+            nt.assert_allclose(np.dot(w, np.prod(X**p, axis=1)), exact,
+                               atol=1e-12)
+
+    nt.assert_raises(ValueError, sparse_grid, bounds, 2, 'foo')
+    nt.assert_raises(ValueError, sparse_grid, bounds, -1)